@@ -17,19 +17,42 @@ OCI 抢机脚本 - 钉钉通知版
 - 停止脚本: kill id 或 pkill -f seckill.py
 """
 
-import argparse, configparser, json, subprocess, oci, sys, time, random, os, requests, hmac, hashlib, base64, urllib.parse
+import argparse, configparser, re, oci, sys, time, random, math, os, requests, hmac, base64, urllib.parse, threading, queue, atexit, signal, tempfile, uuid
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_EXCEPTION
 from datetime import datetime
-from typing import Optional, Tuple, Dict, Any, Union
+from functools import cached_property, lru_cache
+from typing import Optional, Tuple, Dict, Any, Union, List
 from dataclasses import dataclass
 from contextlib import contextmanager
 
 # ==================== 配置常量 ====================
 CONFIG_FILE = "api.conf"          # 配置文件路径
 LOG_DIR = "log"                   # 日志目录
+LOG_BUFFER_SIZE = 64 * 1024       # 日志文件写缓冲大小
+LOG_FLUSH_INTERVAL = 1.0          # 日志刷盘间隔（秒）
+LOG_FLUSH_MARKERS = ("❌", "✅", "⚠️")  # 含这些标记的日志立即刷盘
 DEFAULT_TIMEOUT = 10              # 默认请求超时时间（秒）
-
-# ==================== 文件常量 ====================
-NSG_RULES_FILE = 'ssh-nsg-rules.json'       # NSG规则临时文件
+QUERY_WORKERS = 5                 # 并发查询线程数
+OCI_POOL_CONNECTIONS = 8          # OCI SDK 连接池数量
+OCI_POOL_MAXSIZE = 16             # 每个连接池最大连接数（需大于并发线程数）
+INSTANCE_WAIT_SECONDS = 300       # 等待实例启动的最长时间（秒）
+INSTANCE_POLL_CAP = 10            # 实例状态轮询间隔上限（秒）
+INSTANCE_TERMINAL_STATES = ("RUNNING", "TERMINATED", "TERMINATING")
+
+# ==================== 钉钉通知常量 ====================
+DINGTALK_RATE_PER_MIN = 20        # 钉钉机器人限流：每分钟最多20条
+DINGTALK_QUEUE_SIZE = 256         # 待发送通知队列上限，满时丢弃最旧通知
+DINGTALK_FLUSH_TIMEOUT = 30       # 退出时等待通知发送完成的最长时间（秒）
+
+# ==================== 退避重试常量 ====================
+BACKOFF_BASE = 1.0                # 退避基数（秒）
+BACKOFF_CAP = 60.0                # 单次退避上限（秒）
+BACKOFF_MAX_ATTEMPTS = 10         # 连续瞬时错误最大重试次数
+AUTO_INTERVAL_BASE = 30           # auto 模式抢机间隔基数（秒）
+AUTO_INTERVAL_CAP = 300           # auto 模式抢机间隔上限（秒）
+LAUNCH_RETRY_ATTEMPTS = 4         # 创建实例遇到限流/连接异常时 SDK 内部最大尝试次数
+LAUNCH_RETRY_SECONDS = 60         # 创建实例 SDK 内部重试总时长上限（秒）
 
 # ==================== 网络异常关键词 ====================
 TRANSIENT_ERROR_MARKERS = {
@@ -42,6 +65,73 @@ TRANSIENT_ERROR_MARKERS = {
     "Connection reset by peer",
     "Service Unavailable"
 }
+# 配置读写锁：网络资源创建与镜像/可用性域查询并发时保护 api.conf
+_CONFIG_LOCK = threading.RLock()
+
+# 预编译为单个正则，一次扫描即可判断
+_TRANSIENT_RE = re.compile("|".join(re.escape(marker) for marker in TRANSIENT_ERROR_MARKERS))
+
+# 创建实例的重试策略：仅在 SDK 内重试 429 限流与连接/超时异常；
+# 这些内部重试共用调用方传入的 opc-retry-token，抢机循环的瞬时错误重试也须沿用同一 token（见 new_launch_identity）。
+# 5xx（含主机容量不足）不在此重试，交给抢机循环按用户设定的间隔处理
+_LAUNCH_RETRY_STRATEGY = oci.retry.RetryStrategyBuilder(
+    max_attempts=LAUNCH_RETRY_ATTEMPTS,
+    total_elapsed_time_seconds=LAUNCH_RETRY_SECONDS,
+    service_error_retry_config={429: []},
+    service_error_retry_on_any_5xx=False,
+    backoff_type=oci.retry.BACKOFF_FULL_JITTER_VALUE
+).get_retry_strategy()
+
+# 抢机间隔与退避抖动共用的随机数生成器（启动阶段创建网络资源的退避重试也会使用）；
+# daemonize 会 fork，子进程中重新播种，避免与父进程沿用同一随机序列
+_rng = random.Random()
+os.register_at_fork(after_in_child=_rng.seed)
+
+def _is_transient_error(error_text: str) -> bool:
+    """判断是否为瞬时错误"""
+    return _TRANSIENT_RE.search(error_text) is not None
+
+def _backoff_delay(attempt: int, base: float = BACKOFF_BASE, cap: float = BACKOFF_CAP) -> float:
+    """截断指数退避（全抖动）等待时长"""
+    return _rng.uniform(0, min(cap, base * (2 ** attempt)))
+
+def _backoff_sleep(attempt: int, base: float = BACKOFF_BASE, cap: float = BACKOFF_CAP) -> float:
+    """按截断指数退避等待，返回实际等待秒数"""
+    delay = _backoff_delay(attempt, base, cap)
+    time.sleep(delay)
+    return delay
+
+def _sleep_until(deadline: float):
+    """休眠至单调时钟截止时间（不受系统时间调整影响，被提前唤醒时继续补足）"""
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+        time.sleep(remaining)
+
+def _ts() -> str:
+    """当前时间戳（精确到毫秒），用于日志行前缀"""
+    t = time.time()
+    return f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(t))}.{int(t * 1000) % 1000:03d}"
+
+def _write_config(conf: configparser.ConfigParser, path: str = CONFIG_FILE):
+    """原子写回配置文件：先写同目录临时文件再替换，中途退出不会留下半截配置"""
+    directory = os.path.dirname(os.path.abspath(path))
+    with _CONFIG_LOCK:
+        f = tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=directory,
+                                        prefix=".api.conf.", delete=False)
+        try:
+            with f:
+                conf.write(f)
+                f.flush()
+                os.fsync(f.fileno())
+            if os.path.exists(path):
+                os.chmod(f.name, os.stat(path).st_mode & 0o7777)
+            os.replace(f.name, path)
+        except BaseException:
+            # 写入/刷盘/替换任一步失败都删除临时文件，不在配置目录留下残留
+            os.unlink(f.name)
+            raise
 
 # ==================== 架构配置 ====================
 ARCH_CONFIGS = {
@@ -50,26 +140,45 @@ ARCH_CONFIGS = {
         "ocpu_range": (1, 4),               # OCPU范围：1-4核
         "memory_range": (1, 24),            # 内存范围：1-24GB
         "default_ocpu": 1,                  # 默认OCPU：1核
-        "default_memory": 6                 # 默认内存：6GB
+        "default_memory": 6,                # 默认内存：6GB
+        "image_os_version": "22.04 Minimal aarch64"  # 镜像系统版本（服务端过滤）
     },
     "amd": {
         "shape": "VM.Standard.E2.1.Micro",  # AMD微型实例
         "ocpu_range": (1, 1),               # OCPU范围：1核（固定）
         "memory_range": (1, 1),             # 内存范围：1GB（固定）
         "default_ocpu": 1,                  # 默认OCPU：1核
-        "default_memory": 1                 # 默认内存：1GB
+        "default_memory": 1,                # 默认内存：1GB
+        "image_os_version": "22.04 Minimal"  # 镜像系统版本（服务端过滤）
     }
 }
+IMAGE_OPERATING_SYSTEM = "Canonical Ubuntu"  # 镜像操作系统（服务端过滤）
 
-@dataclass
+class InstanceStateUnknownError(Exception):
+    """实例已创建但无法确认其状态（抢机循环不得据此重新创建实例）"""
+
+@dataclass(frozen=True)
 class InstanceConfig:
-    """实例配置类"""
+    """实例配置类（启动前解析一次，抢机循环中只读）"""
+    __slots__ = ("machine_type", "shape", "ocpus", "memory_gb", "image_name")
     machine_type: str
     shape: str
     ocpus: int
     memory_gb: int
     image_name: str
 
+@dataclass(frozen=True)
+class RuntimeCfg:
+    """运行期只读配置快照（读取配置文件后构造一次；运行中会被改写的网络/镜像等键仍从 conf 读取）"""
+    __slots__ = ("tenancy", "key_file")
+    tenancy: str
+    key_file: str
+
+    @classmethod
+    def from_config(cls, conf: configparser.ConfigParser) -> "RuntimeCfg":
+        defaults = conf["DEFAULT"]
+        return cls(tenancy=defaults.get("tenancy", ""), key_file=defaults.get("key_file", ""))
+
 @dataclass
 class UserConfig:
     """用户配置类"""
@@ -80,12 +189,71 @@ class UserConfig:
     vpus: int
     interval: Union[int, str]
 
+@dataclass
+class BackoffPolicy:
+    """抢机间隔退避策略（auto 模式）"""
+    base: float = AUTO_INTERVAL_BASE
+    cap: float = AUTO_INTERVAL_CAP
+    factor: float = 2.0
+    jitter: str = "full"              # full: 全抖动；none: 不抖动
+    floor: float = 10                 # 最低间隔（秒）
+
+    def next(self, attempt: int) -> int:
+        """第 attempt 次连续容量不足/限流后的等待秒数"""
+        # 指数达到上限后不再增长：长期运行时 attempt 持续累加，否则浮点幂会 OverflowError
+        if self.factor > 1:
+            max_exponent = math.ceil(math.log(self.cap / self.base, self.factor)) if 0 < self.base < self.cap else 0
+            attempt = min(attempt, max_exponent)
+        ceiling = min(self.cap, self.base * self.factor ** attempt)
+        delay = _rng.uniform(0, ceiling) if self.jitter == "full" else ceiling
+        return int(max(self.floor, delay))
+
+@lru_cache(maxsize=4)
+def _load_oci_config(path: str = oci.config.DEFAULT_LOCATION, profile: str = oci.config.DEFAULT_PROFILE) -> Dict[str, Any]:
+    """读取 OCI 配置（按路径+profile缓存，避免重复解析配置和私钥）"""
+    return oci.config.from_file(path, profile)
+
+@lru_cache(maxsize=None)
+def _get_oci_client(client_cls, path: str = oci.config.DEFAULT_LOCATION, profile: str = oci.config.DEFAULT_PROFILE,
+                    retry_strategy=None):
+    """获取 OCI 客户端（按服务+profile缓存，进程内共享）"""
+    kwargs = {'retry_strategy': retry_strategy} if retry_strategy else {}
+    client = client_cls(_load_oci_config(path, profile), **kwargs)
+    # 扩大连接池，使并发查询复用已建立的 TLS 连接；沿用 SDK 自带的适配器类型以保留其传输行为
+    session = client.base_client.session
+    adapter_cls = type(session.get_adapter('https://'))
+    session.mount('https://', adapter_cls(pool_connections=OCI_POOL_CONNECTIONS, pool_maxsize=OCI_POOL_MAXSIZE, max_retries=0))
+    return client
+
+def get_compute_client(retry_strategy=None) -> oci.core.ComputeClient:
+    """共享计算客户端；默认不重试，避免 SDK 自动重试抢机请求"""
+    return _get_oci_client(oci.core.ComputeClient, retry_strategy=retry_strategy)
+
+def get_vnet_client(retry_strategy=oci.retry.DEFAULT_RETRY_STRATEGY) -> oci.core.VirtualNetworkClient:
+    """共享网络客户端"""
+    return _get_oci_client(oci.core.VirtualNetworkClient, retry_strategy=retry_strategy)
+
 class BaseManager:
     """基础管理器类"""
     
     def __init__(self, config: configparser.ConfigParser, compartment_id: str):
         self.config = config
         self.compartment_id = compartment_id
+        self._config_dirty = False
+    
+    @cached_property
+    def vnc(self) -> oci.core.VirtualNetworkClient:
+        """网络客户端（首次使用时创建，进程内复用连接）"""
+        return get_vnet_client()
+    
+    @cached_property
+    def iam(self) -> oci.identity.IdentityClient:
+        """身份客户端（首次使用时创建）"""
+        return _get_oci_client(oci.identity.IdentityClient, retry_strategy=oci.retry.DEFAULT_RETRY_STRATEGY)
+    
+    def _list_all(self, list_func, *args, **kwargs) -> list:
+        """分页获取全部列表结果"""
+        return oci.pagination.list_call_get_all_results(list_func, *args, **kwargs).data
     
     def _log(self, msg: str, logger=None):
         """统一日志输出"""
@@ -94,59 +262,36 @@ class BaseManager:
         else:
             print(msg)
     
-    def _run_cli(self, cmd: list) -> Dict[str, Any]:
-        """运行 oci CLI 并返回 JSON"""
-        try:
-            result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-            
-            if not result.stdout.strip():
-                return {"data": []}
-            
-            try:
-                return json.loads(result.stdout)
-            except json.JSONDecodeError:
-                return {"data": []}
-                
-        except (subprocess.CalledProcessError, Exception):
-            return {"data": []}
+    def _flush_config(self):
+        """配置有改动时一次性写回配置文件"""
+        with _CONFIG_LOCK:
+            if not self._config_dirty:
+                return
+            _write_config(self.config)
+            self._config_dirty = False
     
-    def _run_cli_with_validation(self, cmd: list, resource_name: str, logger=None) -> Dict[str, Any]:
-        """运行CLI命令并进行结果验证"""
-        try:
-            
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=60)
-            
-            if result.returncode != 0:
-                error_msg = result.stderr.strip() or "未知错误"
-                stdout_msg = result.stdout.strip() or "无输出"
-                
-                raise Exception(f"{resource_name}创建失败: {error_msg}")
-            
-            if not result.stdout.strip():
-                raise Exception(f"{resource_name}创建失败：命令返回空输出")
-            
+    def _call_with_validation(self, func, details, resource_name: str, logger=None) -> str:
+        """调用SDK创建资源并验证返回的资源ID，瞬时错误时退避重试
+        
+        同一次逻辑创建的所有尝试（含 SDK 内部重试）共用一个 opc-retry-token：
+        请求已到达服务端但客户端出错时，重试会返回已创建的资源而不是再建一个。
+        """
+        retry_token = uuid.uuid4().hex
+        attempt = 0
+        while True:
             try:
-                return json.loads(result.stdout)
-            except json.JSONDecodeError as e:
-                raise Exception(f"{resource_name}创建失败：JSON解析错误 - {e}")
-            
-        except subprocess.TimeoutExpired:
-            raise Exception(f"{resource_name}创建失败：命令执行超时")
-        except Exception as e:
-            if not isinstance(e, Exception):
-                self._log(f"❌ 创建{resource_name}失败: {e}", logger)
-            raise
-    
-    def _validate_response_data(self, data: Dict[str, Any], resource_name: str, logger=None) -> str:
-        """验证响应数据并返回资源ID"""
-        if isinstance(data, dict) and 'data' in data:
-            resource_data = data['data']
-            if isinstance(resource_data, dict) and 'id' in resource_data:
-                return resource_data['id']
-            else:
-                raise Exception(f"创建{resource_name}失败：返回数据格式错误: {resource_data}")
-        else:
-            raise Exception(f"创建{resource_name}失败：返回数据格式错误: {data}")
+                resource = func(details, opc_retry_token=retry_token).data
+                break
+            except Exception as e:
+                if attempt >= BACKOFF_MAX_ATTEMPTS or not _is_transient_error(str(e)):
+                    raise Exception(f"{resource_name}创建失败: {e}")
+                delay = _backoff_sleep(attempt)
+                attempt += 1
+                self._log(f"⚠️ {resource_name}请求网络异常，已等待 {delay:.1f} 秒，第 {attempt} 次重试", logger)
+        
+        if not resource or not getattr(resource, 'id', None):
+            raise Exception(f"创建{resource_name}失败：返回数据格式错误: {resource}")
+        return resource.id
 
 class DingTalkNotifier(BaseManager):
     """钉钉通知器"""
@@ -155,33 +300,38 @@ class DingTalkNotifier(BaseManager):
         # 由于DingTalkNotifier不需要compartment_id，我们传入一个空字符串
         super().__init__(config, "")
         self._init_dingtalk_config()
+        self._session = requests.Session()
+        self._session.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=8))
+        self._q: queue.Queue = queue.Queue(maxsize=DINGTALK_QUEUE_SIZE)
+        self._dropped = 0
+        self._tokens = float(DINGTALK_RATE_PER_MIN)
+        self._last_refill = time.monotonic()
+        # 后台线程在首次发送时启动，避免 daemonize() 中 fork 后线程丢失
+        self._worker: Optional[threading.Thread] = None
     
     def _init_dingtalk_config(self):
         """初始化钉钉配置"""
         try:
             if "DINGTALK" in self.config:
-                self.webhook = self.config["DINGTALK"].get("webhook", "").strip()
-                self.secret = self.config["DINGTALK"].get("secret", "").strip()
+                self.webhook = self.config["DINGTALK"].get("webhook", "")
+                self.secret = self.config["DINGTALK"].get("secret", "")
             else:
                 self.webhook = ""
                 self.secret = ""
         except Exception:
             self.webhook = ""
             self.secret = ""
+        self._secret_bytes = self.secret.encode('utf-8')
     
     def _calculate_signature(self, timestamp: str) -> str:
         """计算钉钉签名"""
-        string_to_sign = f'{timestamp}\n{self.secret}'
-        hmac_code = hmac.new(
-            self.secret.encode('utf-8'), 
-            string_to_sign.encode('utf-8'), 
-            digestmod=hashlib.sha256
-        ).digest()
+        string_to_sign = f'{timestamp}\n{self.secret}'.encode('utf-8')
+        hmac_code = hmac.digest(self._secret_bytes, string_to_sign, 'sha256')
         return urllib.parse.quote_plus(base64.b64encode(hmac_code))
     
     def send_notification(self, title: str, content: str, msg_type: str = "text", logger=None) -> bool:
         """
-        发送钉钉通知
+        发送钉钉通知（放入队列由后台线程异步发送，不阻塞调用方）
         
         Args:
             title: 通知标题
@@ -190,24 +340,70 @@ class DingTalkNotifier(BaseManager):
             logger: 日志记录器实例
             
         Returns:
-            bool: 发送是否成功
+            bool: 是否已加入发送队列
         """
+        if not self.webhook or not self.secret:
+            self._log("⚠️ 钉钉配置缺失，跳过通知发送", logger)
+            return False
+        
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._dispatch_loop, name="dingtalk-notifier", daemon=True)
+            self._worker.start()
+        
+        item = (title, content, msg_type, logger)
+        try:
+            self._q.put_nowait(item)
+        except queue.Full:
+            # 队列已满，丢弃最旧通知
+            try:
+                self._q.get_nowait()
+                self._q.task_done()
+                self._dropped += 1
+                self._log(f"⚠️ 钉钉通知队列已满，已丢弃 {self._dropped} 条旧通知", logger)
+            except queue.Empty:
+                pass
+            self._q.put_nowait(item)
+        return True
+    
+    def close(self, timeout: float = DINGTALK_FLUSH_TIMEOUT):
+        """等待队列中的通知发送完成（最多 timeout 秒）"""
+        deadline = time.monotonic() + timeout
+        while self._q.unfinished_tasks and self._worker and self._worker.is_alive():
+            if time.monotonic() >= deadline:
+                break
+            time.sleep(0.1)
+        self._session.close()
+    
+    def _dispatch_loop(self):
+        """后台发送循环"""
+        while True:
+            title, content, msg_type, logger = self._q.get()
+            try:
+                self._acquire_token()
+                self._deliver(title, content, msg_type, logger)
+            finally:
+                self._q.task_done()
+    
+    def _acquire_token(self):
+        """令牌桶限流，令牌不足时等待"""
+        rate = DINGTALK_RATE_PER_MIN / 60.0
+        while True:
+            now = time.monotonic()
+            self._tokens = min(float(DINGTALK_RATE_PER_MIN), self._tokens + (now - self._last_refill) * rate)
+            self._last_refill = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            time.sleep((1 - self._tokens) / rate)
+    
+    def _deliver(self, title: str, content: str, msg_type: str, logger=None) -> bool:
+        """实际发送钉钉通知"""
         try:
-            if not self.webhook or not self.secret:
-                self._log("⚠️ 钉钉配置缺失，跳过通知发送", logger)
-                return False
-
             timestamp = str(round(time.time() * 1000))
             sign = self._calculate_signature(timestamp)
             url = f"{self.webhook}&timestamp={timestamp}&sign={sign}"
             message = self._build_message(title, content, msg_type)
-            headers = {'Content-Type': 'application/json'}
-            response = requests.post(
-                url, 
-                headers=headers, 
-                data=json.dumps(message), 
-                timeout=DEFAULT_TIMEOUT
-            )
+            response = self._session.post(url, json=message, timeout=DEFAULT_TIMEOUT)
             
             return self._handle_response(response, title, logger)
             
@@ -248,49 +444,93 @@ class Logger:
     def __init__(self, arch: str):
         self.arch = arch
         self.log_dir = LOG_DIR
-        self.last_log_date = datetime.now().strftime("%Y-%m-%d")
-        self._setup_log_file()
-    
-    def _setup_log_file(self):
+        self._lock = threading.Lock()
+        self._pending = False
+        self._last_flush = time.monotonic()
+        # 后台刷盘线程在首次写日志时启动（fork 后自动重建）
+        self._flusher: Optional[threading.Thread] = None
+        # fork 前刷盘并持有锁，避免缓冲日志在父子进程中重复写入、锁状态不一致
+        os.register_at_fork(before=self._before_fork,
+                            after_in_parent=self._lock.release,
+                            after_in_child=self._lock.release)
+        self._setup_log_file(datetime.now())
+        atexit.register(self.close)
+    
+    def _setup_log_file(self, now: datetime):
         """设置日志文件"""
         os.makedirs(self.log_dir, exist_ok=True)
-        self.log_file = self._get_log_file()
-        self.log_f = open(self.log_file, "a", encoding="utf-8")
+        self._last_ordinal = now.toordinal()
+        self.log_file = self._get_log_file(now)
+        self.log_f = open(self.log_file, "a", encoding="utf-8", buffering=LOG_BUFFER_SIZE)
     
-    def _get_log_file(self) -> str:
+    def _get_log_file(self, now: datetime) -> str:
         """获取日志文件路径"""
-        today_str = datetime.now().strftime("%Y-%m-%d")
-        return os.path.join(self.log_dir, f"{self.arch}_{today_str}.log")
+        return os.path.join(self.log_dir, f"{self.arch}_{now:%Y-%m-%d}.log")
     
     def log(self, msg: str):
         """记录日志"""
-        current_date = datetime.now().strftime("%Y-%m-%d")
-        
-        # 日期变更，切换日志文件
-        if current_date != self.last_log_date:
-            self._switch_log_file(current_date)
-        
-        print(msg)
-        print(msg, file=self.log_f, flush=True)
+        with self._lock:
+            now = datetime.now()
+            
+            # 日期变更，切换日志文件
+            if now.toordinal() != self._last_ordinal:
+                self._switch_log_file(now)
+            
+            print(msg)
+            print(msg, file=self.log_f)
+            self._pending = True
+            
+            # 重要日志或距上次刷盘超过间隔时立即刷盘，其余交给后台线程
+            mono = time.monotonic()
+            if mono - self._last_flush > LOG_FLUSH_INTERVAL or any(m in msg for m in LOG_FLUSH_MARKERS):
+                self._flush_locked(mono)
+            
+            if self._flusher is None or not self._flusher.is_alive():
+                self._flusher = threading.Thread(target=self._flush_loop, name="log-flusher", daemon=True)
+                self._flusher.start()
+    
+    def _flush_locked(self, mono: float):
+        """刷盘（调用方需持有锁）"""
+        if self._pending and not self.log_f.closed:
+            self.log_f.flush()
+        self._pending = False
+        self._last_flush = mono
+    
+    def _before_fork(self):
+        """fork 前获取锁并刷盘"""
+        self._lock.acquire()
+        self._flush_locked(time.monotonic())
+    
+    def _flush_loop(self):
+        """后台定时刷盘，保证空闲时日志也能及时落盘"""
+        while True:
+            time.sleep(LOG_FLUSH_INTERVAL)
+            with self._lock:
+                if self.log_f.closed:
+                    return
+                if self._pending:
+                    self._flush_locked(time.monotonic())
     
-    def _switch_log_file(self, new_date: str):
+    def _switch_log_file(self, now: datetime):
         """切换日志文件"""
         self.log_f.close()
-        self.last_log_date = new_date
-        self.log_file = self._get_log_file()
-        self.log_f = open(self.log_file, "a", encoding="utf-8")
+        self._setup_log_file(now)
     
     def close(self):
         """关闭日志文件"""
-        if hasattr(self, 'log_f'):
-            self.log_f.close()
+        with self._lock:
+            if hasattr(self, 'log_f') and not self.log_f.closed:
+                self.log_f.close()
 
 class NetworkManager(BaseManager):
     """网络资源管理器：确保 VCN、子网、网关、路由表、NSG 存在并保存到配置"""
 
+    _net_cfg_cache: Optional[Tuple[int, Dict[str, str]]] = None  # (id(config), 网络配置)
+
+    @cached_property
     def _region_base_name(self) -> str:
         """从配置中解析 region 的中间部分，例如 ap-singapore-1 -> singapore"""
-        region = self.config['DEFAULT'].get('region', '').strip().lower()
+        region = self.config['DEFAULT'].get('region', '').lower()
         if not region:
             return 'default'
         parts = region.split('-')
@@ -304,13 +544,11 @@ class NetworkManager(BaseManager):
     def get_existing_nsgs(self, vcn_id: str) -> list:
         """获取VCN现有网络安全组列表"""
         try:
-            data = self._run_cli([
-                'oci', 'network', 'nsg', 'list',
-                '--compartment-id', self.compartment_id,
-                '--vcn-id', vcn_id,
-                '--all', '--output', 'json'
-            ])
-            return data.get('data', [])
+            return self._list_all(
+                self.vnc.list_network_security_groups,
+                compartment_id=self.compartment_id,
+                vcn_id=vcn_id
+            )
         except Exception as e:
             self._log(f"获取网络安全组列表失败: {e}")
             return []
@@ -320,14 +558,15 @@ class NetworkManager(BaseManager):
         nsg_display = str(int(time.time() * 1000))
         
         self._log("创建默认网络安全组...", logger)
-        created_nsg = self._run_cli([
-            'oci', 'network', 'nsg', 'create',
-            '--compartment-id', self.compartment_id,
-            '--vcn-id', vcn_id,
-            '--display-name', nsg_display,
-            '--output', 'json'
-        ])['data']
-        nsg_id = created_nsg['id']
+        nsg_id = self._call_with_validation(
+            self.vnc.create_network_security_group,
+            oci.core.models.CreateNetworkSecurityGroupDetails(
+                compartment_id=self.compartment_id,
+                vcn_id=vcn_id,
+                display_name=nsg_display
+            ),
+            "NSG", logger
+        )
 
         self._add_nsg_rules(nsg_id, logger)
         
@@ -336,32 +575,25 @@ class NetworkManager(BaseManager):
 
     def _add_nsg_rules(self, nsg_id: str, logger=None):
         """添加NSG规则"""
-        rules_payload = [
+        models = oci.core.models
+        ssh_port = models.TcpOptions(destination_port_range=models.PortRange(min=22, max=22))
+        rules = [
             # IPv4 SSH
-            {"direction": "INGRESS", "protocol": "6", "source": "10.0.0.0/24", "sourceType": "CIDR_BLOCK"},
-            {"direction": "INGRESS", "protocol": "6", "source": "0.0.0.0/0", "sourceType": "CIDR_BLOCK", "tcpOptions": {"destinationPortRange": {"max": 22, "min": 22}}},
+            models.AddSecurityRuleDetails(direction="INGRESS", protocol="6", source="10.0.0.0/24", source_type="CIDR_BLOCK"),
+            models.AddSecurityRuleDetails(direction="INGRESS", protocol="6", source="0.0.0.0/0", source_type="CIDR_BLOCK", tcp_options=ssh_port),
             # ping
-            {"direction": "INGRESS", "protocol": "1", "source": "0.0.0.0/0", "sourceType": "CIDR_BLOCK"},
+            models.AddSecurityRuleDetails(direction="INGRESS", protocol="1", source="0.0.0.0/0", source_type="CIDR_BLOCK"),
             # IPv6 SSH
-            {"direction": "INGRESS", "protocol": "6", "source": "::/0", "sourceType": "CIDR_BLOCK", "tcpOptions": {"destinationPortRange": {"max": 22, "min": 22}}},
+            models.AddSecurityRuleDetails(direction="INGRESS", protocol="6", source="::/0", source_type="CIDR_BLOCK", tcp_options=ssh_port),
             # IPv6 ping
-            {"direction": "INGRESS", "protocol": "58", "source": "::/0", "sourceType": "CIDR_BLOCK", "icmpOptions": {"type": 128, "code": 0}}
+            models.AddSecurityRuleDetails(direction="INGRESS", protocol="58", source="::/0", source_type="CIDR_BLOCK",
+                                          icmp_options=models.IcmpOptions(type=128, code=0))
         ]
         
-        try:
-            with open(NSG_RULES_FILE, 'w', encoding='utf-8') as f:
-                json.dump(rules_payload, f)
-            self._run_cli([
-                'oci', 'network', 'nsg', 'rules', 'add',
-                '--nsg-id', nsg_id,
-                '--security-rules', f'file://{NSG_RULES_FILE}',
-                '--output', 'json'
-            ])
-        finally:
-            try:
-                os.remove(NSG_RULES_FILE)
-            except Exception:
-                pass
+        self.vnc.add_network_security_group_security_rules(
+            nsg_id,
+            models.AddNetworkSecurityGroupSecurityRulesDetails(security_rules=rules)
+        )
 
     def configure_security_list_rules(self, vcn_id: str, logger=None):
         """智能配置安全列表规则，只在必要时执行"""
@@ -373,94 +605,71 @@ class NetworkManager(BaseManager):
             
             self._log("正在配置安全列表规则...", logger)
             
-            # 获取VCN所有安全列表
-            security_lists = self._run_cli([
-                'oci', 'network', 'security-list', 'list',
-                '--compartment-id', self.compartment_id,
-                '--vcn-id', vcn_id,
-                '--all', '--output', 'json'
-            ])
+            # 获取VCN所有安全列表（list 结果已包含完整规则，无需再逐个 get）
+            security_lists = self._list_all(self.vnc.list_security_lists, self.compartment_id, vcn_id=vcn_id)
             
             configured_count = 0
-            for security_list in security_lists.get('data', []):
-                security_list_id = security_list['id']
-                security_list_name = security_list.get('display-name', 'Unknown')
-                
-                # 检查当前入站规则
-                current_rules = self._run_cli([
-                    'oci', 'network', 'security-list', 'get',
-                    '--security-list-id', security_list_id,
-                    '--output', 'json'
-                ])
-                
-                ingress_rules = current_rules.get('data', {}).get('ingress-security-rules', [])
+            for security_list in security_lists:
+                security_list_id = security_list.id
+                security_list_name = security_list.display_name or 'Unknown'
+                ingress_rules = security_list.ingress_security_rules or []
+                egress_rules = security_list.egress_security_rules or []
                 
                 # 入站规则不为空且不是我们配置的规则时才清空
                 if ingress_rules and not self._is_our_configured_rules(ingress_rules):
                     self._log(f"📝 清空安全列表 '{security_list_name}' 旧入站规则", logger)
                     
                     # 清空入站规则
-                    self._run_cli([
-                        'oci', 'network', 'security-list', 'update',
-                        '--security-list-id', security_list_id,
-                        '--ingress-security-rules', '[]',
-                        '--force',
-                        '--output', 'json'
-                    ])
+                    self.vnc.update_security_list(
+                        security_list_id,
+                        oci.core.models.UpdateSecurityListDetails(ingress_security_rules=[])
+                    )
                 else:
                     self._log(f"✅ 安全列表 '{security_list_name}' 入站规则已正确配置", logger)
                 
                 # 检查并补充出站规则
-                self._check_and_add_egress_rules(security_list_id, security_list_name, logger)
+                self._check_and_add_egress_rules(security_list_id, security_list_name, egress_rules, logger)
                 
                 configured_count += 1
             
             if configured_count > 0:
                 self._log(f"✅ 成功配置 {configured_count} 个安全列表规则", logger)
-                # 标记安全列表已配置
+                # 标记安全列表已配置并写回配置
                 self._mark_security_list_configured(vcn_id)
+                self._flush_config()
             else:
                 self._log("⚠️ 未找到需要配置的安全列表", logger)
                 
         except Exception as e:
             self._log(f"❌ 配置安全列表规则失败: {e}", logger)
 
-    def _check_and_add_egress_rules(self, security_list_id: str, security_list_name: str, logger=None):
-        """检查并添加出站规则"""
+    def _check_and_add_egress_rules(self, security_list_id: str, security_list_name: str,
+                                    egress_rules: List[oci.core.models.EgressSecurityRule], logger=None):
+        """检查并添加出站规则（egress_rules 为调用方已获取的当前出站规则）"""
         try:
-            # 获取当前出站规则
-            current_rules = self._run_cli([
-                'oci', 'network', 'security-list', 'get',
-                '--security-list-id', security_list_id,
-                '--output', 'json'
-            ])
-            
-            egress_rules = current_rules.get('data', {}).get('egress-security-rules', [])
-            
-            # 规则检查
-            destinations = [rule.get('destination', '') for rule in egress_rules]
-            has_ipv4_rule = '0.0.0.0/0' in destinations
-            has_ipv6_rule = '::/0' in destinations
+            # 规则检查（单次遍历，两者都找到即停止）
+            has_ipv4_rule = has_ipv6_rule = False
+            for rule in egress_rules:
+                destination = rule.destination
+                if destination == '0.0.0.0/0':
+                    has_ipv4_rule = True
+                elif destination == '::/0':
+                    has_ipv6_rule = True
+                if has_ipv4_rule and has_ipv6_rule:
+                    break
                 
             # 添加规则
             rules_to_add = [
-                {
-                    "destination": "0.0.0.0/0",
-                    "destinationType": "CIDR_BLOCK",
-                    "protocol": "all",
-                    "isStateless": False
-                } if not has_ipv4_rule else None,
-                {
-                    "destination": "::/0",
-                    "destinationType": "CIDR_BLOCK",
-                    "protocol": "all",
-                    "isStateless": False
-                } if not has_ipv6_rule else None
+                oci.core.models.EgressSecurityRule(
+                    destination=destination,
+                    destination_type="CIDR_BLOCK",
+                    protocol="all",
+                    is_stateless=False
+                )
+                for destination, present in (("0.0.0.0/0", has_ipv4_rule), ("::/0", has_ipv6_rule))
+                if not present
             ]
             
-            # 过滤掉None值
-            rules_to_add = [rule for rule in rules_to_add if rule is not None]
-            
             # 记录需要添加的规则
             if not has_ipv4_rule:
                 self._log(f"📝 需要添加 IPv4 出站规则到 '{security_list_name}'", logger)
@@ -473,13 +682,10 @@ class NetworkManager(BaseManager):
                 all_rules = egress_rules + rules_to_add
                 
                 # 更新出站规则
-                self._run_cli([
-                    'oci', 'network', 'security-list', 'update',
-                    '--security-list-id', security_list_id,
-                    '--egress-security-rules', json.dumps(all_rules),
-                    '--force',
-                    '--output', 'json'
-                ])
+                self.vnc.update_security_list(
+                    security_list_id,
+                    oci.core.models.UpdateSecurityListDetails(egress_security_rules=all_rules)
+                )
                 
                 self._log(f"✅ 已为安全列表 '{security_list_name}' 添加出站规则", logger)
             else:
@@ -492,7 +698,7 @@ class NetworkManager(BaseManager):
         """检查安全列表是否已配置"""
         try:
             # 检查配置文件中是否标记了该VCN的安全列表已配置
-            configured_vcn = self.config['DEFAULT'].get('security_list_configured', '').strip()
+            configured_vcn = self.config['DEFAULT'].get('security_list_configured', '')
             return configured_vcn == vcn_id
         except Exception:
             return False
@@ -501,29 +707,33 @@ class NetworkManager(BaseManager):
         """标记安全列表已配置"""
         try:
             self.config['DEFAULT']['security_list_configured'] = vcn_id
-            with open(CONFIG_FILE, 'w', encoding='utf-8') as f:
-                self.config.write(f)
+            self._config_dirty = True
         except Exception as e:
             self._log(f"⚠️ 标记安全列表配置状态失败: {e}")
     
-    def _is_our_configured_rules(self, rules: list) -> bool:
+    def _is_our_configured_rules(self, rules: List[oci.core.models.IngressSecurityRule]) -> bool:
         """检查规则是否是我们配置的规则"""
         if not rules:
             return True
         return False
 
-    def ensure_network(self, logger=None) -> Dict[str, str]:
-        """检查/创建 VCN、子网、网关、路由/NSG，并返回关键ID"""
+    def ensure_network(self, logger=None, before_create=None) -> Dict[str, str]:
+        """检查/创建 VCN、子网、网关、路由/NSG，并返回关键ID
+        
+        before_create: 需要新建资源时，在清空配置和创建任何资源之前调用（可抛异常中止），
+        用于先确认并发查询的结果，避免查询失败时留下孤立的网络资源。
+        """
         self._log("正在检查网络资源...", logger)
         
         # 读取已有配置
         net_config = self._get_network_config()
-        base = self._region_base_name()
+        base = self._region_base_name
         
         # 验证现有网络资源是否存在
         if self._validate_existing_resources(net_config, logger):
             self._log("✅ 已全部验证通过，无需更改配置", logger)
             self._save_network_config(net_config)
+            self._flush_config()
             return net_config
         else:
             self._log("❌ 本地配置验证失败，尝试查询远程现有资源...", logger)
@@ -533,9 +743,12 @@ class NetworkManager(BaseManager):
             if remote_net_config:
                 self._log("✅ 发现远程现有网络资源，使用远程配置", logger)
                 self._save_network_config(remote_net_config)
+                self._flush_config()
                 return remote_net_config
             else:
                 self._log("❌ 未发现远程现有资源，清空配置并重新创建", logger)
+                if before_create:
+                    before_create()
                 self._clear_network_config()
                 net_config = self._get_network_config()  # 重新获取清空后的配置
         
@@ -545,20 +758,26 @@ class NetworkManager(BaseManager):
         # 新建 VCN 创建其余资源
         self._create_network_resources(vcn_id, net_config, base, logger)
         self._save_network_config(net_config)
+        self._flush_config()
         
         self._log("已配齐 VCN 资源，网络资源检查完成。", logger)
         return net_config
 
     def _get_network_config(self) -> Dict[str, str]:
-        """获取网络配置"""
-        return {
-            'vcn_id': self.config['DEFAULT'].get('vcn_id', '').strip(),
-            'vcn_name': self.config['DEFAULT'].get('vcn_name', '').strip(),
-            'subnet_id': self.config['DEFAULT'].get('subnet_id', '').strip(),
-            'internet_gateway_id': self.config['DEFAULT'].get('internet_gateway_id', '').strip(),
-            'route_table_id': self.config['DEFAULT'].get('route_table_id', '').strip(),
-            'nsg_id': self.config['DEFAULT'].get('nsg_id', '').strip()
-        }
+        """获取网络配置（缓存，返回副本供调用方修改）"""
+        cache = self._net_cfg_cache
+        if cache is None or cache[0] != id(self.config):
+            defaults = self.config['DEFAULT']
+            cache = (id(self.config), {
+                'vcn_id': defaults.get('vcn_id', ''),
+                'vcn_name': defaults.get('vcn_name', ''),
+                'subnet_id': defaults.get('subnet_id', ''),
+                'internet_gateway_id': defaults.get('internet_gateway_id', ''),
+                'route_table_id': defaults.get('route_table_id', ''),
+                'nsg_id': defaults.get('nsg_id', '')
+            })
+            self._net_cfg_cache = cache
+        return dict(cache[1])
     
     def _validate_existing_resources(self, net_config: Dict[str, str], logger=None) -> bool:
         """验证现有网络资源是否在OCI中存在"""
@@ -576,33 +795,28 @@ class NetworkManager(BaseManager):
             self._log("未检测到任何网络资源ID，需要重新创建", logger)
             return False
         
-        # 验证VCN是否存在
-        if net_config['vcn_id']:
-            if not self._validate_vcn_exists(net_config['vcn_id'], logger):
-                return False
-        
-        # 验证子网是否存在
-        if net_config['subnet_id']:
-            if not self._validate_subnet_exists(net_config['subnet_id'], logger):
-                return False
-        
-        # 验证网关是否存在
-        if net_config['internet_gateway_id']:
-            if not self._validate_igw_exists(net_config['internet_gateway_id'], logger):
-                return False
+        # 并发验证 VCN、子网、网关、路由表是否存在
+        checks = [
+            (self._validate_vcn_exists, net_config['vcn_id']),
+            (self._validate_subnet_exists, net_config['subnet_id']),
+            (self._validate_igw_exists, net_config['internet_gateway_id']),
+            (self._validate_route_table_exists, net_config['route_table_id'])
+        ]
+        checks = [(func, resource_id) for func, resource_id in checks if resource_id]
         
-        # 验证路由表是否存在
-        if net_config['route_table_id']:
-            if not self._validate_route_table_exists(net_config['route_table_id'], logger):
-                return False
+        self.vnc  # 先在主线程创建客户端，供各线程共享
+        with ThreadPoolExecutor(max_workers=QUERY_WORKERS) as executor:
+            futures = [executor.submit(func, resource_id, logger) for func, resource_id in checks]
+            wait(futures)
         
-        return True
+        # 任一验证失败或抛出异常均视为验证失败，转入远程查询
+        return all(not future.exception() and future.result() for future in futures)
     
-    def _validate_resource_exists(self, resource_type: str, resource_id: str, cli_cmd: list, logger=None) -> bool:
+    def _validate_resource_exists(self, resource_type: str, resource_id: str, get_func, logger=None) -> bool:
         """通用资源验证方法"""
         try:
-            data = self._run_cli(cli_cmd)
-            if data.get('data', {}).get('id') == resource_id:
+            resource = get_func(resource_id).data
+            if resource.id == resource_id:
                 self._log(f"✅ {resource_type}验证通过", logger)
                 return True
             else:
@@ -614,52 +828,37 @@ class NetworkManager(BaseManager):
     
     def _validate_vcn_exists(self, vcn_id: str, logger=None) -> bool:
         """验证VCN是否存在"""
-        return self._validate_resource_exists("VCN", vcn_id, [
-            'oci', 'network', 'vcn', 'get',
-            '--vcn-id', vcn_id,
-            '--output', 'json'
-        ], logger)
+        return self._validate_resource_exists("VCN", vcn_id, self.vnc.get_vcn, logger)
     
     def _validate_subnet_exists(self, subnet_id: str, logger=None) -> bool:
         """验证子网是否存在"""
-        return self._validate_resource_exists("子网", subnet_id, [
-            'oci', 'network', 'subnet', 'get',
-            '--subnet-id', subnet_id,
-            '--output', 'json'
-        ], logger)
+        return self._validate_resource_exists("子网", subnet_id, self.vnc.get_subnet, logger)
     
     def _validate_igw_exists(self, igw_id: str, logger=None) -> bool:
         """验证网关是否存在"""
-        return self._validate_resource_exists("网关", igw_id, [
-            'oci', 'network', 'internet-gateway', 'get',
-            '--ig-id', igw_id,
-            '--output', 'json'
-        ], logger)
+        return self._validate_resource_exists("网关", igw_id, self.vnc.get_internet_gateway, logger)
     
     def _validate_route_table_exists(self, route_table_id: str, logger=None) -> bool:
         """验证路由表是否存在"""
-        return self._validate_resource_exists("路由表", route_table_id, [
-            'oci', 'network', 'route-table', 'get',
-            '--rt-id', route_table_id,
-            '--output', 'json'
-        ], logger)
+        return self._validate_resource_exists("路由表", route_table_id, self.vnc.get_route_table, logger)
     
     def _clear_network_config(self):
         """清空网络资源配置"""
         network_keys = [
             'vcn_id', 'vcn_name', 'subnet_id', 'internet_gateway_id', 
-            'route_table_id', 'availability_domain'
+            'route_table_id'
         ]
         
-        cleared_keys = [key for key in network_keys if key in self.config['DEFAULT']]
-        for key in cleared_keys:
-            del self.config['DEFAULT'][key]
+        with _CONFIG_LOCK:
+            cleared_keys = [key for key in network_keys if key in self.config['DEFAULT']]
+            for key in cleared_keys:
+                del self.config['DEFAULT'][key]
+        self._net_cfg_cache = None
         cleared_count = len(cleared_keys)
         
         if cleared_count > 0:
-            # 保存清空后的配置
-            with open(CONFIG_FILE, 'w', encoding='utf-8') as f:
-                self.config.write(f)
+            # 标记待保存，由 ensure_network 统一写回
+            self._config_dirty = True
             print(f"✅ 已清空 {cleared_count} 个网络资源配置项")
         else:
             print("✅ 无需清空网络资源配置")
@@ -670,20 +869,16 @@ class NetworkManager(BaseManager):
         
         try:
             # 查询现有VCN
-            vcns = self._run_cli([
-                'oci', 'network', 'vcn', 'list',
-                '--compartment-id', self.compartment_id,
-                '--all', '--output', 'json'
-            ])
+            vcns = self._list_all(self.vnc.list_vcns, self.compartment_id)
             
-            if not vcns.get('data'):
+            if not vcns:
                 self._log("远程未发现VCN", logger)
                 return None
             
             # 使用第一个VCN
-            vcn = vcns['data'][0]
-            vcn_id = vcn.get('id', '')
-            vcn_name = vcn.get('display-name', '')
+            vcn = vcns[0]
+            vcn_id = vcn.id or ''
+            vcn_name = vcn.display_name or ''
             
             if not vcn_id:
                 self._log("VCN ID获取失败", logger)
@@ -691,58 +886,38 @@ class NetworkManager(BaseManager):
             
             self._log(f"发现远程VCN: {vcn_name}", logger)
             
-            # 查询该VCN下的子网
-            subnets = self._run_cli([
-                'oci', 'network', 'subnet', 'list',
-                '--compartment-id', self.compartment_id,
-                '--vcn-id', vcn_id,
-                '--all', '--output', 'json'
-            ])
+            # 并发查询该VCN下的子网、网关、路由表及可用性域
+            with ThreadPoolExecutor(max_workers=QUERY_WORKERS) as executor:
+                subnets_future = executor.submit(self._list_all, self.vnc.list_subnets, self.compartment_id, vcn_id=vcn_id)
+                igws_future = executor.submit(self._list_all, self.vnc.list_internet_gateways, self.compartment_id, vcn_id=vcn_id)
+                route_tables_future = executor.submit(self._list_all, self.vnc.list_route_tables, self.compartment_id, vcn_id=vcn_id)
+                availability_domains_future = executor.submit(self.iam.list_availability_domains, self.compartment_id)
+                subnets = subnets_future.result()
+                igws = igws_future.result()
+                route_tables = route_tables_future.result()
+                availability_domains = availability_domains_future.result().data
             
             subnet_id = ""
-            if subnets.get('data'):
-                subnet = subnets['data'][0]
-                subnet_id = subnet.get('id', '')
-                self._log(f"发现远程子网: {subnet.get('display-name', 'Unknown')}", logger)
-            
-            # 查询该VCN的网关
-            igws = self._run_cli([
-                'oci', 'network', 'internet-gateway', 'list',
-                '--compartment-id', self.compartment_id,
-                '--vcn-id', vcn_id,
-                '--all', '--output', 'json'
-            ])
+            if subnets:
+                subnet = subnets[0]
+                subnet_id = subnet.id or ''
+                self._log(f"发现远程子网: {subnet.display_name or 'Unknown'}", logger)
             
             igw_id = ""
-            if igws.get('data'):
-                igw = igws['data'][0]
-                igw_id = igw.get('id', '')
-                self._log(f"发现网关: {igw.get('display-name', 'Unknown')}", logger)
-            
-            # 查询该VCN下的路由表
-            route_tables = self._run_cli([
-                'oci', 'network', 'route-table', 'list',
-                '--compartment-id', self.compartment_id,
-                '--vcn-id', vcn_id,
-                '--all', '--output', 'json'
-            ])
+            if igws:
+                igw = igws[0]
+                igw_id = igw.id or ''
+                self._log(f"发现网关: {igw.display_name or 'Unknown'}", logger)
             
             route_table_id = ""
-            if route_tables.get('data'):
-                route_table = route_tables['data'][0]
-                route_table_id = route_table.get('id', '')
-                self._log(f"发现路由表: {route_table.get('display-name', 'Unknown')}", logger)
-            
-            # 查询可用性域
-            availability_domains = self._run_cli([
-                'oci', 'iam', 'availability-domain', 'list',
-                '--compartment-id', self.compartment_id,
-                '--output', 'json'
-            ])
+            if route_tables:
+                route_table = route_tables[0]
+                route_table_id = route_table.id or ''
+                self._log(f"发现路由表: {route_table.display_name or 'Unknown'}", logger)
             
             availability_domain = ""
-            if availability_domains.get('data'):
-                availability_domain = availability_domains['data'][0].get('name', '')
+            if availability_domains:
+                availability_domain = availability_domains[0].name or ''
                 self._log(f"发现可用性域: {availability_domain}", logger)
             
             # 网络配置
@@ -772,16 +947,13 @@ class NetworkManager(BaseManager):
         self._log(f"正在创建VCN: {vcn_display} (启用IPv6)...", logger)
         
         try:
-            created = self._run_cli([
-                'oci', 'network', 'vcn', 'create',
-                '--compartment-id', self.compartment_id,
-                '--cidr-block', '10.0.0.0/16',
-                '--display-name', vcn_display,
-                '--is-ipv6-enabled', 'true',
-                '--output', 'json'
-            ])
-            vcn = created.get('data', {})
-            vcn_id = vcn.get('id', '')
+            vcn = self.vnc.create_vcn(oci.core.models.CreateVcnDetails(
+                compartment_id=self.compartment_id,
+                cidr_block='10.0.0.0/16',
+                display_name=vcn_display,
+                is_ipv6_enabled=True
+            )).data
+            vcn_id = vcn.id if vcn else ''
             if not vcn_id:
                 raise Exception("创建VCN失败：未获取到VCN ID")
             net_config['vcn_name'] = vcn_display
@@ -796,31 +968,35 @@ class NetworkManager(BaseManager):
         """创建网络资源"""
         self._log("正在创建所有网络资源...", logger)
         
-        # 创建网关
-        self._create_internet_gateway(vcn_id, net_config, base, logger)
-        # 设置路由表
-        self._setup_route_table(vcn_id, net_config, logger)
-        # 创建子网
-        self._create_subnet(vcn_id, net_config, base, logger)
-        # 创建NSG
-        self._create_nsg(vcn_id, net_config, base, logger)
+        with ThreadPoolExecutor(max_workers=QUERY_WORKERS) as executor:
+            # 第一批：网关、NSG、VCN IPv6 信息互不依赖，并发执行
+            igw_future = executor.submit(self._create_internet_gateway, vcn_id, net_config, base, logger)
+            nsg_future = executor.submit(self._create_nsg, vcn_id, net_config, base, logger)
+            ipv6_future = executor.submit(self._get_vcn_ipv6_cidrs, vcn_id, logger)
+            
+            # 第二批：路由表依赖网关，子网依赖 VCN IPv6 前缀
+            igw_future.result()
+            route_future = executor.submit(self._setup_route_table, vcn_id, net_config, logger)
+            subnet_future = executor.submit(self._create_subnet, vcn_id, net_config, base, ipv6_future.result(), logger)
+            
+            for future in (route_future, subnet_future, nsg_future):
+                future.result()
 
     def _create_internet_gateway(self, vcn_id: str, net_config: Dict[str, str], base: str, logger=None):
         """创建网关"""
         self._log("创建网关中...", logger)
         igw_display = f"{base}-internet-gateway"
         
-        cmd = [
-            'oci', 'network', 'internet-gateway', 'create',
-            '--compartment-id', self.compartment_id,
-            '--vcn-id', vcn_id,
-            '--display-name', igw_display,
-            '--is-enabled', 'true',
-            '--output', 'json'
-        ]
-        
-        data = self._run_cli_with_validation(cmd, "IGW", logger)
-        igw_id = self._validate_response_data(data, "IGW", logger)
+        igw_id = self._call_with_validation(
+            self.vnc.create_internet_gateway,
+            oci.core.models.CreateInternetGatewayDetails(
+                compartment_id=self.compartment_id,
+                vcn_id=vcn_id,
+                display_name=igw_display,
+                is_enabled=True
+            ),
+            "IGW", logger
+        )
         net_config['internet_gateway_id'] = igw_id
         self._log(f"✅ 已创建网关: {igw_display}", logger)
 
@@ -828,65 +1004,44 @@ class NetworkManager(BaseManager):
         """设置路由表"""
         self._log("获取VCN默认路由表并更新规则...", logger)
         
-        # 获取VCN默认路由表
-        route_tables = self._run_cli([
-            'oci', 'network', 'route-table', 'list',
-            '--compartment-id', self.compartment_id,
-            '--vcn-id', vcn_id,
-            '--all', '--output', 'json'
-        ])
-        
         # 获取VCN默认路由表（VCN创建时自动生成）
-        route_tables_data = route_tables.get('data', [])
-        self._log(f"找到 {len(route_tables_data)} 个路由表", logger)
+        route_tables = self._list_all(self.vnc.list_route_tables, self.compartment_id, vcn_id=vcn_id)
+        self._log(f"找到 {len(route_tables)} 个路由表", logger)
         
-        if not route_tables_data:
+        if not route_tables:
             raise Exception("VCN中未找到任何路由表，这不应该发生")
         
         # VCN创建时自动生成的路由表就是默认路由表
-        default_rt = route_tables_data[0]
-        rt_name = default_rt.get('display-name', 'Unknown')
-        self._log(f"使用VCN默认路由表: {rt_name}", logger)
+        default_rt = route_tables[0]
+        self._log(f"使用VCN默认路由表: {default_rt.display_name or 'Unknown'}", logger)
         
         # 使用默认路由表并更新规则
-        net_config['route_table_id'] = default_rt['id']
+        net_config['route_table_id'] = default_rt.id
         
         # 更新路由规则（添加网关路由）
-        rules = json.dumps([
-            {"cidrBlock": "0.0.0.0/0", "networkEntityId": net_config['internet_gateway_id']},
-            {"destination": "::/0", "destinationType": "CIDR_BLOCK", "networkEntityId": net_config['internet_gateway_id']}
-        ])
-        
-        self._run_cli([
-            'oci', 'network', 'route-table', 'update',
-            '--rt-id', default_rt['id'],
-            '--route-rules', rules,
-            '--force',
-            '--output', 'json'
-        ])
+        igw_id = net_config['internet_gateway_id']
+        self.vnc.update_route_table(default_rt.id, oci.core.models.UpdateRouteTableDetails(route_rules=[
+            oci.core.models.RouteRule(destination="0.0.0.0/0", destination_type="CIDR_BLOCK", network_entity_id=igw_id),
+            oci.core.models.RouteRule(destination="::/0", destination_type="CIDR_BLOCK", network_entity_id=igw_id)
+        ]))
         
         self._log(f"✅ 已更新默认路由表规则", logger)
 
-    def _create_subnet(self, vcn_id: str, net_config: Dict[str, str], base: str, logger=None):
+    def _get_vcn_ipv6_cidrs(self, vcn_id: str, logger=None) -> list:
+        """获取VCN IPv6前缀"""
+        self._log("正在获取VCN的IPv6配置信息...", logger)
+        vcn_ipv6_cidrs = self.vnc.get_vcn(vcn_id).data.ipv6_cidr_blocks or []
+        self._log(f"VCN IPv6 CIDR信息: {vcn_ipv6_cidrs}", logger)
+        return vcn_ipv6_cidrs
+
+    def _create_subnet(self, vcn_id: str, net_config: Dict[str, str], base: str, vcn_ipv6_cidrs: list, logger=None):
         """创建子网"""
         self._log("创建子网 (启用IPv6)...", logger)
         subnet_display = f"{base}-subnet"
         
         try:
-            # 获取VCN IPv6前缀
-            self._log("正在获取VCN的IPv6配置信息...", logger)
-            vcn_info = self._run_cli([
-                'oci', 'network', 'vcn', 'get',
-                '--vcn-id', vcn_id,
-                '--output', 'json'
-            ])
-
-            vcn_data = vcn_info.get('data', {})
-            vcn_ipv6_cidrs = vcn_data.get('ipv6-cidr-blocks', [])
             vcn_ipv6_cidr = vcn_ipv6_cidrs[0] if vcn_ipv6_cidrs else ''
             
-            self._log(f"VCN IPv6 CIDR信息: {vcn_ipv6_cidrs}", logger)
-            
             if not vcn_ipv6_cidr:
                 raise Exception("VCN未获取到IPv6 CIDR")
             
@@ -895,19 +1050,18 @@ class NetworkManager(BaseManager):
             subnet_ipv6_cidr = f"{vcn_ipv6_prefix.rstrip(':')}::/64"
             
             # 子网
-            cmd = [
-                'oci', 'network', 'subnet', 'create',
-                '--compartment-id', self.compartment_id,
-                '--vcn-id', vcn_id,
-                '--cidr-block', '10.0.0.0/24',
-                '--ipv6-cidr-block', subnet_ipv6_cidr,
-                '--display-name', subnet_display,
-                '--prohibit-public-ip-on-vnic', 'false',
-                '--output', 'json'
-            ]
-            
-            data = self._run_cli_with_validation(cmd, "子网", logger)
-            subnet_id = self._validate_response_data(data, "子网", logger)
+            subnet_id = self._call_with_validation(
+                self.vnc.create_subnet,
+                oci.core.models.CreateSubnetDetails(
+                    compartment_id=self.compartment_id,
+                    vcn_id=vcn_id,
+                    cidr_block='10.0.0.0/24',
+                    ipv6_cidr_block=subnet_ipv6_cidr,
+                    display_name=subnet_display,
+                    prohibit_public_ip_on_vnic=False
+                ),
+                "子网", logger
+            )
             net_config['subnet_id'] = subnet_id
             self._log(f"✅ 已创建子网: {subnet_display}", logger)
             
@@ -922,16 +1076,15 @@ class NetworkManager(BaseManager):
         self._log("创建 NSG 并添加 22/TCP 入站规则...", logger)
         nsg_display = str(int(time.time() * 1000))
         
-        cmd = [
-            'oci', 'network', 'nsg', 'create',
-            '--compartment-id', self.compartment_id,
-            '--vcn-id', vcn_id,
-            '--display-name', nsg_display,
-            '--output', 'json'
-        ]
-        
-        data = self._run_cli_with_validation(cmd, "NSG", logger)
-        nsg_id = self._validate_response_data(data, "NSG", logger)
+        nsg_id = self._call_with_validation(
+            self.vnc.create_network_security_group,
+            oci.core.models.CreateNetworkSecurityGroupDetails(
+                compartment_id=self.compartment_id,
+                vcn_id=vcn_id,
+                display_name=nsg_display
+            ),
+            "NSG", logger
+        )
         net_config['nsg_id'] = nsg_id
         self._add_nsg_rules(nsg_id, logger)
         self._log(f"✅ 已创建 NSG: {nsg_display} 并添加规则", logger)
@@ -939,105 +1092,95 @@ class NetworkManager(BaseManager):
     def _save_network_config(self, net_config: Dict[str, str]):
         """保存网络配置"""
         valid_config = {k: v for k, v in net_config.items() if v}
-        self.config['DEFAULT'].update(valid_config)
-        with open(CONFIG_FILE, 'w', encoding='utf-8') as f:
-            self.config.write(f)
+        with _CONFIG_LOCK:
+            self.config['DEFAULT'].update(valid_config)
+        self._net_cfg_cache = None
+        self._config_dirty = True
 
 class OCIInstanceManager(BaseManager):
     """OCI实例管理器"""
     
     def __init__(self, config: configparser.ConfigParser, compartment_id: str):
         super().__init__(config, compartment_id)
-        self.compute_client = oci.core.ComputeClient(oci.config.from_file())
+        self.compute_client = get_compute_client()
     
     def get_image_id(self, arch: str) -> str:
         """根据架构获取镜像 ID 并写入配置文件"""
         key_image = f"{arch}_image"
         key_name = f"{arch}_name"
-        image_id = self.config["DEFAULT"].get(key_image, "").strip()
-        image_name = self.config["DEFAULT"].get(key_name, "").strip()
+        image_id = self.config["DEFAULT"].get(key_image, "")
+        image_name = self.config["DEFAULT"].get(key_name, "")
         
         if image_id and image_name:
             return image_id
 
         try:
-            # 获取镜像列表
-            cmd = [
-                "oci", "compute", "image", "list",
-                "--compartment-id", self.compartment_id,
-                "--output", "json",
-                "--all"
-            ]
-            result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-            images = json.loads(result.stdout)["data"]
-
-            # 过滤 Ubuntu 22.04 Minimal 镜像
-            images = [img for img in images if "Canonical-Ubuntu-22.04-Minimal" in img.get("display-name", "")]
-            
-            # 根据架构过滤
-            if arch == "arm":
-                images = [img for img in images if "aarch64" in img.get("operating-system-version", "")]
-            elif arch == "amd":
-                images = [img for img in images if "aarch64" not in img.get("operating-system-version", "")]
-            else:
+            arch_cfg = ARCH_CONFIGS.get(arch)
+            if arch_cfg is None:
                 raise ValueError(f"未知架构: {arch}")
 
+            # 由服务端按系统、版本、shape 过滤并按创建时间倒序，只取最新一个
+            images = self.compute_client.list_images(
+                self.compartment_id,
+                operating_system=IMAGE_OPERATING_SYSTEM,
+                operating_system_version=arch_cfg['image_os_version'],
+                shape=arch_cfg['shape'],
+                sort_by="TIMECREATED",
+                sort_order="DESC",
+                limit=1
+            ).data
+
             if not images:
                 raise ValueError(f"未找到合适的 {arch.upper()} 镜像")
 
-            # 选择最新创建镜像
-            selected = max(images, key=lambda x: x["time-created"])
-            image_id = selected["id"]
-            image_name = selected.get("operating-system-version", "Unknown")
+            selected = images[0]
+            image_id = selected.id
+            image_name = selected.operating_system_version or "Unknown"
 
             print(f"获取 {arch.upper()} 镜像 ID: {image_id}, 系统版本: Ubuntu {image_name}")
 
             # 保存到配置文件
             self._save_config_values({key_image: image_id, key_name: image_name})
+            self._flush_config()
             return image_id
 
         except Exception as e:
-            print(f"获取 {arch.upper()} 镜像失败: {e}")
-            sys.exit(1)
+            raise Exception(f"获取 {arch.upper()} 镜像失败: {e}") from e
     
     def _save_config_values(self, values: Dict[str, str]):
-        """保存配置值到配置文件"""
-        self.config["DEFAULT"].update(values)
-        with open(CONFIG_FILE, "w", encoding="utf-8") as f:
-            self.config.write(f)
-    
-    def get_config_or_cli(self, key: str, cli_cmd: list, json_path, description: str) -> str:
-        """从配置文件或CLI获取配置值"""
-        value = self.config["DEFAULT"].get(key, "").strip()
+        """更新内存中的配置值，由 _flush_config 统一写回"""
+        with _CONFIG_LOCK:
+            self.config["DEFAULT"].update(values)
+            self._config_dirty = True
+    
+    def get_config_or_query(self, key: str, list_func, value_of, description: str) -> str:
+        """从配置文件获取配置值，缺失时通过SDK查询"""
+        value = self.config["DEFAULT"].get(key, "")
         if value:
             return value
             
         try:
-            result = subprocess.run(cli_cmd, capture_output=True, text=True, check=True)
-            data = json.loads(result.stdout)
-            if "data" in data and len(data["data"]) > 0:
-                value = json_path(data)
+            items = list_func()
+            if items:
+                value = value_of(items[0])
                 print(f"获取到 {description}: {value}")
                 self._save_config_values({key: value})
                 return value
             else:
                 raise ValueError(f"无法获取 {description}")
         except Exception as e:
-            print(f"获取 {description} 失败: {e}, 停止脚本")
-            sys.exit(1)
-    
-    def create_instance(self, instance_config: InstanceConfig, image_id: str, 
-                       availability_domain: str, subnet_id: str, ssh_key: str, 
-                       disk_size: int, disk_vpus: int, nsg_id: str = "", logger=None) -> Tuple[oci.core.models.Instance, str]:
-        """创建实例"""
-        display_name = f"{int(time.time() * 1000)}-instance"
-        
+            raise Exception(f"获取 {description} 失败: {e}") from e
+    
+    def build_launch_details(self, instance_config: InstanceConfig, image_id: str,
+                             availability_domain: str, subnet_id: str, ssh_key: str,
+                             disk_size: int, disk_vpus: int, nsg_id: str = "") -> oci.core.models.LaunchInstanceDetails:
+        """构造创建实例请求模板（除 display_name 外各字段在抢机过程中不变，只需构造一次）"""
         nsg_ids = [nsg_id] if nsg_id else None
         
-        instance_details = oci.core.models.LaunchInstanceDetails(
+        return oci.core.models.LaunchInstanceDetails(
             availability_domain=availability_domain,
             compartment_id=self.compartment_id,
-            display_name=display_name,
+            display_name=None,
             image_id=image_id,
             shape=instance_config.shape,
             shape_config=oci.core.models.LaunchInstanceShapeConfigDetails(
@@ -1058,49 +1201,70 @@ class OCIInstanceManager(BaseManager):
             ),
             metadata={"ssh_authorized_keys": ssh_key}
         )
+    
+    @staticmethod
+    def new_launch_identity() -> Tuple[str, str]:
+        """生成一次逻辑创建使用的 (opc-retry-token, display_name)
         
-        try:
-            response = self.compute_client.launch_instance(instance_details)
-            if response and response.data:
-                instance = response.data
-                
-                # 等待实例状态变为RUNNING
-                self._log("等待实例启动...", logger)
-                self._wait_for_instance_running(instance.id, logger)
-                
-                # 分配IPv6地址
-                self._assign_ipv6_to_instance(instance.id, logger)
-                
-                return instance, display_name
-            else:
-                raise Exception("创建实例响应为空")
-        except Exception as e:
-            raise e
+        超时等瞬时错误时请求可能已在服务端建机，重试必须沿用同一组值，服务端才会返回原实例而不是再建一台；
+        只有收到明确的 ServiceError 响应后才生成新的一组。
+        """
+        return uuid.uuid4().hex, f"{int(time.time() * 1000)}-instance"
+    
+    def create_instance(self, launch_details: oci.core.models.LaunchInstanceDetails,
+                        retry_token: str, display_name: str,
+                        logger=None) -> Tuple[oci.core.models.Instance, str]:
+        """创建实例（每次请求仅更新模板的 display_name）"""
+        launch_details.display_name = display_name
+        
+        response = self.compute_client.launch_instance(
+            launch_details, opc_retry_token=retry_token, retry_strategy=_LAUNCH_RETRY_STRATEGY)
+        if not (response and response.data):
+            raise Exception("创建实例响应为空")
+        instance = response.data
+        
+        # 等待实例状态变为RUNNING
+        self._log("等待实例启动...", logger)
+        self._wait_for_instance_running(instance.id, logger)
+        
+        # 分配IPv6地址
+        self._assign_ipv6_to_instance(instance.id, logger)
+        
+        return instance, display_name
     
     def _wait_for_instance_running(self, instance_id: str, logger=None):
-        """等待实例状态变为RUNNING"""
-        max_wait_time = 300  # 最多等待5分钟
-        check_interval = 10  # 每10秒检查一次
+        """等待实例进入终态（RUNNING/TERMINATED），轮询交给SDK的指数退避
         
-        start_time = time.time()
-        while time.time() - start_time < max_wait_time:
+        实例此时已创建：轮询出错（限流、5xx、创建后短暂 404 等）只记录并继续等待，
+        超时仍无法确认状态时抛出 InstanceStateUnknownError，不能让抢机循环重新创建实例。
+        """
+        deadline = time.monotonic() + INSTANCE_WAIT_SECONDS
+        last_error = None
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise InstanceStateUnknownError(
+                    f"实例已创建（{instance_id}），但在 {INSTANCE_WAIT_SECONDS} 秒内未能确认其状态: {last_error or '启动超时'}")
             try:
-                response = self.compute_client.get_instance(instance_id)
-                lifecycle_state = response.data.lifecycle_state
-                
-                if lifecycle_state == "RUNNING":
-                    self._log("✅ 实例已启动完成", logger)
-                    return
-                elif lifecycle_state in ["TERMINATED", "TERMINATING"]:
-                    raise Exception(f"实例启动失败，状态: {lifecycle_state}")
-                else:
-                    self._log(f"实例状态: {lifecycle_state}，继续等待...", logger)
-                    time.sleep(check_interval)
+                response = oci.wait_until(
+                    self.compute_client,
+                    self.compute_client.get_instance(
+                        instance_id, retry_strategy=oci.retry.DEFAULT_RETRY_STRATEGY),
+                    evaluate_response=lambda r: r.data.lifecycle_state in INSTANCE_TERMINAL_STATES,
+                    max_wait_seconds=remaining,
+                    max_interval_seconds=INSTANCE_POLL_CAP)
+                break
+            except oci.exceptions.MaximumWaitTimeExceeded:
+                continue
             except Exception as e:
-                self._log(f"检查实例状态时出错: {e}", logger)
-                time.sleep(check_interval)
-        
-        raise Exception("实例启动超时")
+                last_error = e
+                self._log(f"检查实例状态时出错: {e}，继续等待...", logger)
+                time.sleep(min(INSTANCE_POLL_CAP, max(0.0, deadline - time.monotonic())))
+
+        lifecycle_state = response.data.lifecycle_state
+        if lifecycle_state != "RUNNING":
+            raise Exception(f"实例启动失败，状态: {lifecycle_state}")
+        self._log("✅ 实例已启动完成", logger)
     
     def _assign_ipv6_to_instance(self, instance_id: str, logger=None):
         """给实例分配IPv6地址"""
@@ -1120,16 +1284,10 @@ class OCIInstanceManager(BaseManager):
             vnic_attachment = vnic_attachments.data[0]
             vnic_id = vnic_attachment.vnic_id
             
-            # 使用CLI命令分配IPv6地址
-            cmd = [
-                'oci', 'network', 'ipv6', 'create',
-                '--vnic-id', vnic_id,
-                '--output', 'json'
-            ]
-            
-            result = self._run_cli(cmd)
-            if result.get('data'):
-                ipv6_address = result['data'].get('ip-address', 'Unknown')
+            # 分配IPv6地址
+            ipv6 = self.vnc.create_ipv6(oci.core.models.CreateIpv6Details(vnic_id=vnic_id)).data
+            if ipv6:
+                ipv6_address = ipv6.ip_address or 'Unknown'
                 self._log(f"✅ 已分配IPv6地址: {ipv6_address}", logger)
             else:
                 self._log("⚠️ IPv6地址分配可能失败，但继续执行", logger)
@@ -1138,26 +1296,28 @@ class OCIInstanceManager(BaseManager):
             self._log(f"❌ 分配IPv6地址失败: {e}", logger)
 
 def get_instance_config(arch: str, ocpus: Optional[int], memory: Optional[int], config: configparser.ConfigParser) -> InstanceConfig:
-    """获取实例配置"""
-    if arch == "arm":
-        return InstanceConfig(
-            machine_type="ARM",
-            shape="VM.Standard.A1.Flex",
-            ocpus=min(max(1, ocpus if ocpus is not None else 1), 4),
-            memory_gb=min(max(1, memory if memory is not None else 6), 24),
-            image_name=f"Ubuntu {config['DEFAULT'].get('arm_name', 'Unknown')}"
-        )
-    elif arch == "amd":
-        return InstanceConfig(
-            machine_type="AMD",
-            shape="VM.Standard.E2.1.Micro",
-            ocpus=1,
-            memory_gb=1,
-            image_name=f"Ubuntu {config['DEFAULT'].get('amd_name', 'Unknown')}"
-        )
-    else:
+    """获取实例配置（从 ARCH_CONFIGS 解析一次）"""
+    arch_cfg = ARCH_CONFIGS.get(arch)
+    if arch_cfg is None:
         print("❌ 未知架构类型")
         sys.exit(1)
+    
+    ocpu_min, ocpu_max = arch_cfg['ocpu_range']
+    memory_min, memory_max = arch_cfg['memory_range']
+    return InstanceConfig(
+        machine_type=arch.upper(),
+        shape=arch_cfg['shape'],
+        ocpus=min(max(ocpu_min, ocpus if ocpus is not None else arch_cfg['default_ocpu']), ocpu_max),
+        memory_gb=min(max(memory_min, memory if memory is not None else arch_cfg['default_memory']), memory_max),
+        image_name=f"Ubuntu {config['DEFAULT'].get(f'{arch}_name', 'Unknown')}"
+    )
+
+def load_config(path: str = CONFIG_FILE) -> configparser.ConfigParser:
+    """读取配置文件（configparser 读取时已去除值两端空白，后续无需再 strip）"""
+    conf = configparser.ConfigParser(strict=False, delimiters=('='), interpolation=None)
+    conf.optionxform = str
+    conf.read(path)
+    return conf
 
 def read_ssh_key(key_file_path: str) -> str:
     """读取SSH密钥"""
@@ -1202,11 +1362,19 @@ def get_valid_input(prompt: str, min_val: int, max_val: int, default: int) -> in
 def get_time_interval() -> Union[int, str]:
     """获取时间间隔配置"""
     while True:
-        time_input = input("请输入抢机时间（默认60秒，最低10秒，支持区间如30-60）: ").strip()
+        time_input = input("请输入抢机时间（默认60秒，最低10秒，支持区间如30-60，auto 或 auto:30-300 为自动退避）: ").strip()
         if not time_input:
             return 60
         try:
-            if "-" in time_input:
+            if time_input.lower().startswith("auto"):
+                bounds = time_input[4:].lstrip(":").strip()
+                if not bounds:
+                    return f"auto:{AUTO_INTERVAL_BASE}-{AUTO_INTERVAL_CAP}"
+                base, cap = map(int, bounds.split("-"))
+                if base >= 10 and base <= cap:
+                    return f"auto:{base}-{cap}"
+                print("❌ 自动退避起始值必须≥10，且不大于上限")
+            elif "-" in time_input:
                 parts = time_input.split("-")
                 if len(parts) == 2:
                     min_time, max_time = int(parts[0]), int(parts[1])
@@ -1223,7 +1391,7 @@ def get_time_interval() -> Union[int, str]:
                 else:
                     print("❌ 抢机时间必须≥10秒")
         except ValueError:
-            print("❌ 请输入有效数字或区间格式（如30-60）")
+            print("❌ 请输入有效数字、区间格式（如30-60）或 auto")
 
 def user_input() -> UserConfig:
     """获取用户输入的配置"""
@@ -1281,8 +1449,8 @@ def select_nsg(conf: configparser.ConfigParser, compartment_id: str, vcn_id: str
     selected_nsg_id = ""
     if existing_nsgs:
         print("检测到现有网络安全组:")
-        for i, nsg in enumerate(existing_nsgs, 1):
-            print(f"{i} {nsg.get('display-name', 'Unknown')}")
+        nsg_by_idx = {str(i): nsg for i, nsg in enumerate(existing_nsgs, 1)}
+        print("\n".join(f"{i} {nsg.display_name or 'Unknown'}" for i, nsg in nsg_by_idx.items()))
         
         while True:
             choice = input(f"请选择网络安全组 (1-{len(existing_nsgs)}) 或输入 'new' 创建新的: ").strip()
@@ -1290,16 +1458,12 @@ def select_nsg(conf: configparser.ConfigParser, compartment_id: str, vcn_id: str
                 selected_nsg_id = network_manager.create_default_nsg(vcn_id, logger)
                 print(f"✅ 已创建新的网络安全组")
                 break
-            try:
-                choice_num = int(choice)
-                if 1 <= choice_num <= len(existing_nsgs):
-                    selected_nsg_id = existing_nsgs[choice_num - 1]['id']
-                    print(f"✅ 已选择网络安全组: {existing_nsgs[choice_num - 1].get('display-name', 'Unknown')}")
-                    break
-                else:
-                    print(f"❌ 请输入 1-{len(existing_nsgs)} 之间的数字")
-            except ValueError:
-                print("❌ 请输入有效数字或 'new'")
+            nsg = nsg_by_idx.get(choice)
+            if nsg is not None:
+                selected_nsg_id = nsg.id
+                print(f"✅ 已选择网络安全组: {nsg.display_name or 'Unknown'}")
+                break
+            print(f"❌ 请输入 1-{len(existing_nsgs)} 之间的数字或 'new'")
     else:
         print("未检测到现有网络安全组，正在创建默认网络安全组...")
         selected_nsg_id = network_manager.create_default_nsg(vcn_id, logger)
@@ -1321,10 +1485,8 @@ def select_nsg(conf: configparser.ConfigParser, compartment_id: str, vcn_id: str
         else:
             print("❌ 请输入 y 或 n")
     
-    # 保存选择的NSG ID到配置
+    # 保存选择的NSG ID到配置（进入后台前统一写回）
     conf["DEFAULT"]["nsg_id"] = selected_nsg_id
-    with open(CONFIG_FILE, "w", encoding="utf-8") as f:
-        conf.write(f)
     
     return selected_nsg_id
 
@@ -1334,13 +1496,7 @@ def get_nsg_name(nsg_id: str) -> str:
         return ""
     
     try:
-        nsg_data = subprocess.run([
-            'oci', 'network', 'nsg', 'get',
-            '--nsg-id', nsg_id,
-            '--output', 'json'
-        ], capture_output=True, text=True, check=True)
-        nsg_info = json.loads(nsg_data.stdout)["data"]
-        return nsg_info.get('display-name', 'Unknown')
+        return get_vnet_client().get_network_security_group(nsg_id).data.display_name or 'Unknown'
     except Exception:
         return "Unknown"
 
@@ -1369,9 +1525,20 @@ def daemonize():
         # fork失败，继续在前台运行
         print(f"切换到后台失败: {e}，继续在前台运行")
 
+def _parse_backoff_policy(interval: Union[int, str]) -> Optional[BackoffPolicy]:
+    """解析 auto 模式退避策略，非 auto 模式返回 None"""
+    if isinstance(interval, str) and interval.startswith("auto:"):
+        base, cap = map(int, interval[5:].split("-"))
+        return BackoffPolicy(base=base, cap=cap)
+    return None
+
 def _parse_interval_config(interval: Union[int, str]) -> Tuple[int, int, str]:
     """解析时间间隔配置"""
-    if isinstance(interval, str) and "-" in interval:
+    policy = _parse_backoff_policy(interval)
+    if policy:
+        min_interval, max_interval = int(policy.base), int(policy.cap)
+        interval_display = f"自动退避 {min_interval}-{max_interval}"
+    elif isinstance(interval, str) and "-" in interval:
         min_interval, max_interval = map(int, interval.split("-"))
         interval_display = f"{min_interval}-{max_interval}"
     else:
@@ -1381,26 +1548,23 @@ def _parse_interval_config(interval: Union[int, str]) -> Tuple[int, int, str]:
 
 def handle_service_error(e: oci.exceptions.ServiceError, current_interval: int, logger: Logger, 
                          info_msg: str, notifier: DingTalkNotifier) -> bool:
-    """处理OCI服务错误"""
+    """处理OCI服务错误，返回是否继续抢机（429 已由 SDK 重试策略退避过，此处仅记录）"""
     status_code = e.status
-    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
-    
-    # 定义错误处理映射
-    error_handlers = {
-        500: {
-            'retry': True,
-            'msg': f"{timestamp}: ❌ 服务器内部错误，等待 {current_interval} 秒重试",
-            'special_case': ("Out of host capacity", f"{timestamp}: ❌ 主机容量不足，等待 {current_interval} 秒重试")
-        },
-        429: {
-            'retry': True,
-            'msg': f"{timestamp}: ❌ 请求频率过高，等待 {current_interval} 秒重试"
-        },
-        400: {
-            'retry': False,
-            'msg': f"{timestamp}: ⚠️ 已超出账户限制（请检查配额），停止脚本",
-            'title': "⚠️ 抢机最终失败",
-            'content': f"""⚠️ 抢机最终失败
+    timestamp = _ts()
+    
+    # 可重试错误：只记录日志，由抢机循环按间隔等待
+    if status_code == 500:
+        reason = "主机容量不足" if "Out of host capacity" in str(e) else "服务器内部错误"
+        logger.log(f"{timestamp}: ❌ {reason}，等待 {current_interval} 秒重试")
+        return True
+    if status_code == 429:
+        logger.log(f"{timestamp}: ❌ 请求频率过高，等待 {current_interval} 秒重试")
+        return True
+    
+    # 不可重试错误：记录日志并发送失败通知
+    if status_code == 400:
+        logger.log(f"{timestamp}: ⚠️ 已超出账户限制（请检查配额），停止脚本")
+        content = f"""⚠️ 抢机最终失败
 
 {info_msg}
 
@@ -1409,14 +1573,9 @@ def handle_service_error(e: oci.exceptions.ServiceError, current_interval: int,
 错误时间: {timestamp}
 
 状态: 脚本已停止，请检查账户配额"""
-        }
-    }
-    
-    handler = error_handlers.get(status_code, {
-        'retry': False,
-        'msg': f"{timestamp}: ⚠️ 未知错误，停止脚本\n异常内容: {e}",
-        'title': "⚠️ 抢机最终失败",
-        'content': f"""⚠️ 抢机最终失败
+    else:
+        logger.log(f"{timestamp}: ⚠️ 未知错误，停止脚本\n异常内容: {e}")
+        content = f"""⚠️ 抢机最终失败
 
 {info_msg}
 
@@ -1427,41 +1586,27 @@ def handle_service_error(e: oci.exceptions.ServiceError, current_interval: int,
 错误状态: 脚本已停止
 
 异常详情: {e}"""
-    })
-    
-    # 处理特殊情况的500错误
-    if status_code == 500 and "Out of host capacity" in str(e):
-        logger.log(handler['special_case'][1])
-    else:
-        logger.log(handler['msg'])
-    
-    # 发送失败通知
-    if not handler['retry'] and 'title' in handler:
-        notifier.send_notification(handler['title'], handler['content'], "markdown", logger)
     
-    return handler['retry']
+    notifier.send_notification("⚠️ 抢机最终失败", content, "markdown", logger)
+    return False
 
 def main():
     """主函数"""
     
-    def _is_transient_error(e: Exception) -> bool:
-        """判断是否为瞬时错误"""
-        error_text = str(e)
-        return any(marker in error_text for marker in TRANSIENT_ERROR_MARKERS)
-    
-    def _handle_transient_error(e: Exception, current_interval: int, logger: Logger):
-        """处理瞬时错误"""
-        msg = f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]}: ❌ 网络/连接异常，等待 {current_interval} 秒重试\n异常内容: {e}"
+    def _handle_transient_error(e: Exception, attempt: int, logger: Logger):
+        """处理瞬时错误（截断指数退避）"""
+        delay = _backoff_delay(attempt)
+        msg = f"{_ts()}: ❌ 网络/连接异常（第 {attempt + 1} 次），等待 {delay:.1f} 秒重试\n异常内容: {e}"
         logger.log(msg)
         try:
-            time.sleep(current_interval)
+            time.sleep(delay)
         except KeyboardInterrupt:
             logger.log("\n用户中断，退出脚本")
             raise
     
     def _handle_fatal_error(e: Exception, info_msg: str, notifier: DingTalkNotifier, logger: Logger):
         """处理致命错误"""
-        msg = f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]}: ⚠️ 未知异常，停止脚本\n异常内容: {e}"
+        msg = f"{_ts()}: ⚠️ 未知异常，停止脚本\n异常内容: {e}"
         logger.log(msg)
         
         final_failure_content = f"""⚠️ 抢机最终失败
@@ -1470,65 +1615,82 @@ def main():
 
 错误类型: 未知异常
 
-错误时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+错误时间: {time.strftime('%Y-%m-%d %H:%M:%S')}
 
 错误状态: 脚本已停止
 
 异常详情: {e}"""
         notifier.send_notification("⚠️ 抢机最终失败", final_failure_content, "markdown", logger)
     
+    # kill 默认发送 SIGTERM，转换为正常退出以便刷盘日志、发送剩余通知
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    
     # 交互式获取用户输入
     user_config = user_input()
     
     # 读取配置
-    conf = configparser.ConfigParser(strict=False, delimiters=('='))
-    conf.optionxform = str
-    conf.read(CONFIG_FILE)
-    compartment_id = conf["DEFAULT"].get("tenancy")
+    conf = load_config()
+    runtime_cfg = RuntimeCfg.from_config(conf)
+    compartment_id = runtime_cfg.tenancy
     
     # 初始化组件
     logger = Logger(user_config.arch)
     notifier = DingTalkNotifier(conf)
     instance_manager = OCIInstanceManager(conf, compartment_id)
     
-    # 获取镜像ID（同时保存镜像名称到配置文件）
-    image_id = instance_manager.get_image_id(user_config.arch)
-
-    # 网络资源检查/创建
-    network_manager = NetworkManager(conf, compartment_id)
-    net_ids = network_manager.ensure_network(logger)
+    # 镜像ID与可用性域查询不依赖网络资源，与网络检查/创建并发执行
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        image_future = executor.submit(instance_manager.get_image_id, user_config.arch)
+        ad_future = executor.submit(
+            instance_manager.get_config_or_query,
+            "availability_domain",
+            lambda: instance_manager.iam.list_availability_domains(compartment_id).data,
+            lambda ad: ad.name,
+            "可用性域"
+        )
+        
+        def _await_lookups() -> Tuple[str, str]:
+            """等待镜像/可用性域查询，任一失败立即停止脚本"""
+            done, _ = wait((image_future, ad_future), return_when=FIRST_EXCEPTION)
+            for future in done:
+                if future.exception() is not None:
+                    logger.log(f"❌ {future.exception()}, 停止脚本")
+                    sys.exit(1)
+            return image_future.result(), ad_future.result()
+        
+        # 网络资源检查/创建（需要新建资源时先确认查询结果，失败则不创建任何资源）
+        network_manager = NetworkManager(conf, compartment_id)
+        net_ids = network_manager.ensure_network(logger, before_create=_await_lookups)
+        
+        # 获取镜像ID（同时保存镜像名称到配置文件）与可用性域
+        image_id, availability_domain = _await_lookups()
     
     # 获取VCN ID用于NSG选择
     vcn_id = net_ids.get('vcn_id', '')
     if not vcn_id:
-        vcn_id = conf["DEFAULT"].get("vcn_id", "").strip()
+        vcn_id = conf["DEFAULT"].get("vcn_id", "")
     
     # 清除保存的NSG ID，每次重新选择
     if "nsg_id" in conf["DEFAULT"]:
         del conf["DEFAULT"]["nsg_id"]
-        with open(CONFIG_FILE, "w", encoding="utf-8") as f:
-            conf.write(f)
     
     # NSG选择（在网络资源创建之后）
     nsg_id = select_nsg(conf, compartment_id, vcn_id, logger)
     
     # 获取配置信息
-    availability_domain = instance_manager.get_config_or_cli(
-        "availability_domain",
-        ["oci", "iam", "availability-domain", "list", "--compartment-id", compartment_id],
-        lambda data: data["data"][0]["name"],
-        "可用性域"
-    )
-    
-    subnet_id = net_ids.get('subnet_id') or instance_manager.get_config_or_cli(
-        "subnet_id",
-        ["oci", "network", "subnet", "list", "--compartment-id", compartment_id],
-        lambda data: data["data"][0]["id"],
-        "子网"
-    )
+    try:
+        subnet_id = net_ids.get('subnet_id') or instance_manager.get_config_or_query(
+            "subnet_id",
+            lambda: oci.pagination.list_call_get_all_results(instance_manager.vnc.list_subnets, compartment_id).data,
+            lambda subnet: subnet.id,
+            "子网"
+        )
+    except Exception as e:
+        logger.log(f"❌ {e}, 停止脚本")
+        sys.exit(1)
     
     # 读取SSH密钥
-    ssh_key = read_ssh_key(conf["DEFAULT"].get("key_file"))
+    ssh_key = read_ssh_key(runtime_cfg.key_file)
     
     # 获取实例配置
     instance_config = get_instance_config(user_config.arch, user_config.ocpus, user_config.memory, conf)
@@ -1545,9 +1707,10 @@ def main():
     
     # 处理时间间隔
     min_interval, max_interval, interval_display = _parse_interval_config(user_config.interval)
+    backoff_policy = _parse_backoff_policy(user_config.interval)
     
     print("=" * 50)
-    print(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} 开始轮询，{interval_display} 秒请求一次")
+    print(f"{time.strftime('%Y-%m-%d %H:%M:%S')} 开始轮询，{interval_display} 秒请求一次")
     print("=" * 50)
     print("脚本已切换到后台运行模式，日志保存到 log 目录")
     print("查看实时日志，请使用: tail -f log/arm_YYYY-MM-DD.log 或 log/amd_YYYY-MM-DD.log")
@@ -1555,31 +1718,54 @@ def main():
     print("如需停止脚本，请使用: kill id 或 pkill -f seckill.py")
     print("=" * 50)
     
+    # 创建实例请求模板，抢机循环内复用
+    launch_details = instance_manager.build_launch_details(
+        instance_config, image_id, availability_domain, subnet_id, ssh_key,
+        user_config.disk_size, user_config.vpus, nsg_id
+    )
+    
+    # 启动阶段的配置改动（NSG选择、可用性域、子网等）在进入后台前一次性写回
+    _write_config(conf)
+    
     # 切换到后台运行
     daemonize()
     
+    # 连续瞬时错误次数，成功请求到API后归零
+    transient_attempt = 0
+    # auto 模式下连续容量不足/限流次数，网络异常时归零
+    capacity_attempt = 0
+    # 当前逻辑创建的 (opc-retry-token, display_name)：瞬时错误重试时沿用，收到 ServiceError 后重新生成
+    launch_identity = None
+    # 固定间隔在循环外确定，随机区间/auto 模式每轮计算
+    fixed_interval = None if backoff_policy or isinstance(user_config.interval, str) else user_config.interval
+    
     try:
         while True:
             try:
-                # 计算当前轮次的时间间隔
-                current_interval = random.randint(min_interval, max_interval) if isinstance(user_config.interval, str) else user_config.interval
+                # 计算当前轮次的时间间隔，从发起请求时开始计时
+                if fixed_interval is not None:
+                    current_interval = fixed_interval
+                elif backoff_policy:
+                    current_interval = backoff_policy.next(capacity_attempt)
+                else:
+                    current_interval = _rng.randint(min_interval, max_interval)
+                deadline = time.monotonic() + current_interval
                 
                 # 创建实例
-                instance, display_name = instance_manager.create_instance(
-                    instance_config, image_id, availability_domain, subnet_id, ssh_key, 
-                    user_config.disk_size, user_config.vpus, nsg_id, logger
-                )
+                if launch_identity is None:
+                    launch_identity = instance_manager.new_launch_identity()
+                instance, display_name = instance_manager.create_instance(launch_details, *launch_identity, logger=logger)
                 
                 # 验证实例创建是否成功
                 if instance and hasattr(instance, 'id'):
                     # 成功通知
-                    success_msg = f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]}: ✅ 创建成功"
+                    success_msg = f"{_ts()}: ✅ 创建成功"
                     logger.log(success_msg)
                     success_content = f"""🎉 抢机成功！
 
 {info_msg}
 
-开机时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+开机时间: {time.strftime('%Y-%m-%d %H:%M:%S')}
 
 主机名称: {display_name}
 
@@ -1593,10 +1779,14 @@ IPv6支持: 已启用"""
                     raise Exception("实例创建响应无效")
 
             except oci.exceptions.ServiceError as e:
+                # 服务端已明确拒绝本次创建，下一次尝试使用新的 token
+                launch_identity = None
+                transient_attempt = 0
                 if not handle_service_error(e, current_interval, logger, info_msg, notifier):
                     break
+                capacity_attempt += 1
                 try:
-                    time.sleep(current_interval)
+                    _sleep_until(deadline)
                 except KeyboardInterrupt:
                     logger.log("\n用户中断，退出脚本")
                     break
@@ -1604,10 +1794,17 @@ IPv6支持: 已启用"""
             except KeyboardInterrupt:
                 logger.log("\n用户中断，退出脚本")
                 break
+            
+            except InstanceStateUnknownError as e:
+                # 实例已创建，不论异常内容如何都不再重新创建，避免重复开机
+                _handle_fatal_error(e, info_msg, notifier, logger)
+                break
                 
             except Exception as e:
-                if _is_transient_error(e):
-                    _handle_transient_error(e, current_interval, logger)
+                if _is_transient_error(str(e)) and transient_attempt < BACKOFF_MAX_ATTEMPTS:
+                    _handle_transient_error(e, transient_attempt, logger)
+                    transient_attempt += 1
+                    capacity_attempt = 0
                     continue
                 
                 # 其余未知异常：记录并发送最终失败通知
@@ -1615,6 +1812,7 @@ IPv6支持: 已启用"""
                 break
                 
     finally:
+        notifier.close()
         logger.close()
 
 if __name__ == "__main__":
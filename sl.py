@@ -2,55 +2,63 @@
 pip3 install prettytable
 
 """
-import configparser, oci
+import oci
+from concurrent.futures import ThreadPoolExecutor
 from prettytable import PrettyTable
 
-# 读取配置
-conf = configparser.ConfigParser(strict=False, delimiters=('='))
-conf.optionxform = str
-conf.read("/root/.oci/config")
-compartment_id = conf["DEFAULT"].get("tenancy")
+QUERY_WORKERS = 5  # 每个线程池的并发数（两池合计不超过 SDK 默认连接池大小 10）
 
-# 从配置文件加载 OCI 配置信息
+# 从配置文件加载 OCI 配置信息（只解析一次，租户ID与客户端共用）
 config = oci.config.from_file()
+compartment_id = config["tenancy"]
 
-# 创建客户端
-compute_client = oci.core.ComputeClient(config)
-vcn_client = oci.core.VirtualNetworkClient(config)
-block_client = oci.core.BlockstorageClient(config)
+# 创建客户端（并发查询时由默认重试策略处理 429 限流）
+retry_strategy = oci.retry.DEFAULT_RETRY_STRATEGY
+compute_client = oci.core.ComputeClient(config, retry_strategy=retry_strategy)
+vcn_client = oci.core.VirtualNetworkClient(config, retry_strategy=retry_strategy)
+block_client = oci.core.BlockstorageClient(config, retry_strategy=retry_strategy)
 
 # 获取所有实例
 instances = compute_client.list_instances(compartment_id).data
 
 table = PrettyTable(["display-name", "Public_IP", "Private_IP", "IPv6", "Size_GB"])
 
-for instance in instances:
+
+def boot_volume_size(instance):
+    """获取实例硬盘大小"""
+    boot_volumes = compute_client.list_boot_volume_attachments(
+        compartment_id=compartment_id,
+        instance_id=instance.id,
+        availability_domain=instance.availability_domain
+    ).data
+    if not boot_volumes:
+        return ""
+    boot_vol = block_client.get_boot_volume(boot_volumes[0].boot_volume_id).data
+    return f"{boot_vol.size_in_gbs}G"
+
+
+def rows(instance):
+    """查询单个实例的表格行：硬盘链交给 volume_pool，VNIC 链在当前线程执行"""
+    size_future = volume_pool.submit(boot_volume_size, instance)
+
     # 获取实例VNIC
     vnics = compute_client.list_vnic_attachments(compartment_id, instance_id=instance.id).data
+    result = []
     for vnic_attachment in vnics:
         vnic = vcn_client.get_vnic(vnic_attachment.vnic_id).data
         ipv6_addrs = vnic.ipv6_addresses
         ipv6 = ipv6_addrs[0] if ipv6_addrs else ""
+        result.append([instance.display_name, vnic.public_ip or "", vnic.private_ip, ipv6])
+
+    size_gb = size_future.result()
+    return [row + [size_gb] for row in result]
+
+
+# 硬盘查询使用独立线程池，避免实例线程等待自身线程池中的任务而死锁
+with ThreadPoolExecutor(QUERY_WORKERS) as volume_pool, ThreadPoolExecutor(QUERY_WORKERS) as instance_pool:
+    all_rows = [row for instance_rows in instance_pool.map(rows, instances) for row in instance_rows]
 
-        # 获取实例硬盘大小
-        boot_volumes = compute_client.list_boot_volume_attachments(
-            compartment_id=compartment_id,
-            instance_id=instance.id,
-            availability_domain=instance.availability_domain
-        ).data
-
-        size_gb = ""
-        if boot_volumes:
-            boot_vol_id = boot_volumes[0].boot_volume_id
-            boot_vol = block_client.get_boot_volume(boot_vol_id).data
-            size_gb = f"{boot_vol.size_in_gbs}G"
-
-        table.add_row([
-            instance.display_name,
-            vnic.public_ip or "",
-            vnic.private_ip,
-            ipv6,
-            size_gb
-        ])
+# 一次性批量写入表格
+table.add_rows(all_rows)
 
 print(table)